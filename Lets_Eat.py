@@ -1,50 +1,104 @@
 #!/usr/bin/env python3
 # Demo code — set GOOGLE_MAPS_API_KEY or pass --api-key
 import argparse
+import heapq
 import math
 import os
+import queue
 import random
+import threading
 import time
-from typing import List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
 
 try:
     import googlemaps
+    import requests
     from googlemaps.exceptions import ApiError, TransportError, Timeout
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except Exception:
-    googlemaps = None  # type: ignore
+    googlemaps = requests = None  # type: ignore
     ApiError = TransportError = Timeout = Exception  # type: ignore
 
+try:
+    import numpy as np
+except Exception:
+    np = None  # type: ignore
+
 LatLng = Tuple[float, float]
 
+# Reverse-geocode probes run concurrently; stay under Google's default 10 QPS.
+PROBE_WORKERS = 8
+
+# Geocoding results are stable, so successful lookups are memoized per process.
+# Reverse lookups key on coordinates rounded to 4 decimals (~11 m).
+GEO_CACHE_SIZE = 4096
+_geocode_cache: Dict[str, LatLng] = {}
+_postal_cache: Dict[LatLng, str] = {}
+_cache_lock = threading.Lock()
+
+def _remember(cache: dict, key, value) -> None:
+    with _cache_lock:
+        if len(cache) >= GEO_CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+        cache[key] = value
+
+# googlemaps backs off on 500/503/504 and OVER_QUERY_LIMIT, giving up after
+# RETRY_TIMEOUT seconds (its default of 60 s stalls the probes). The session
+# covers only what it doesn't: connection errors, 429 (honouring Retry-After)
+# and 502.
+RETRY_TIMEOUT = 10
+
+def pooled_session() -> "requests.Session":
+    s = requests.Session()
+    retry = Retry(connect=3, status=3, status_forcelist=[429, 502], backoff_factor=0.5,
+                  respect_retry_after_header=True, raise_on_status=False)
+    s.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry))
+    return s
+
 def build_client(api_key: str) -> "googlemaps.Client":
     if not api_key:
         raise ValueError("Missing API key. Pass --api-key or set GOOGLE_MAPS_API_KEY.")
     if googlemaps is None:
         raise RuntimeError("googlemaps package not installed. Run: pip install googlemaps")
-    return googlemaps.Client(key=api_key)
+    return googlemaps.Client(key=api_key, requests_session=pooled_session(), retry_timeout=RETRY_TIMEOUT)
 
 def geocode_zip(gmaps: "googlemaps.Client", zip_code: str) -> Optional[LatLng]:
+    ll = _geocode_cache.get(zip_code)
+    if ll is not None:
+        return ll
     try:
         res = gmaps.geocode(zip_code)
         if not res:
             return None
         loc = res[0]["geometry"]["location"]
-        return (float(loc["lat"]), float(loc["lng"]))
+        ll = (float(loc["lat"]), float(loc["lng"]))
     except Exception:
         return None
+    _remember(_geocode_cache, zip_code, ll)
+    return ll
 
 def reverse_postal(gmaps: "googlemaps.Client", lat: float, lng: float) -> str:
+    key = (round(lat, 4), round(lng, 4))
+    z = _postal_cache.get(key)
+    if z is not None:
+        return z
     try:
-        res = gmaps.reverse_geocode((lat, lng), result_type=["postal_code"]) 
+        res = gmaps.reverse_geocode((lat, lng), result_type=["postal_code"])
         if not res:
             return ""
         comps = res[0].get("address_components", [])
+        z = ""
         for c in comps:
             if "postal_code" in c.get("types", []):
-                return c.get("long_name", "") or ""
-        return ""
+                z = c.get("long_name", "") or ""
+                break
     except Exception:
         return ""
+    if z:
+        _remember(_postal_cache, key, z)
+    return z
 
 def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     R = 6371000.0
@@ -55,35 +109,55 @@ def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
+def haversine_many_m(lat: float, lng: float, points: Sequence[LatLng]) -> List[float]:
+    if np is None or not points:
+        return [haversine_m(lat, lng, la, lo) for la, lo in points]
+    R = 6371000.0
+    p = math.pi / 180
+    pts = np.asarray(points, dtype=np.float64)
+    lats, lons = pts[:, 0], pts[:, 1]
+    dlat = (lats - lat) * p
+    dlon = (lons - lng) * p
+    a = np.sin(dlat/2)**2 + math.cos(lat*p) * np.cos(lats*p) * np.sin(dlon/2)**2
+    return (2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))).tolist()
+
 def nearby_zips(gmaps: "googlemaps.Client", center: LatLng, base_zip: str, max_count: int = 12) -> List[str]:
     lat, lng = center
-    out = []
     seen = set([base_zip]) if base_zip else set()
-    candidates = {}
-    for miles in (5.0, 10.0):
+    candidates: Dict[str, float] = {}
+
+    def ring(miles: float) -> List[LatLng]:
         dlat = miles / 69.0
         dlon = miles / (69.0 * max(math.cos(lat * math.pi/180), 0.0001))
-        offsets = [
+        return [
             (lat + dlat, lng), (lat - dlat, lng),
             (lat, lng + dlon), (lat, lng - dlon),
             (lat + dlat, lng + dlon), (lat + dlat, lng - dlon), (lat - dlat, lng + dlon), (lat - dlat, lng - dlon),
         ]
-        for (la, lo) in offsets:
-            z = reverse_postal(gmaps, la, lo)
-            if not z:
+
+    offsets = ring(5.0) + ring(10.0)
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as ex:
+        zips = ex.map(lambda p: reverse_postal(gmaps, *p), offsets)
+        for z, d in zip(zips, haversine_many_m(lat, lng, offsets)):
+            if not z or z in seen:
                 continue
-            d = haversine_m(lat, lng, la, lo)
             if z not in candidates or d < candidates[z]:
                 candidates[z] = d
-    ranked = sorted(candidates.items(), key=lambda kv: kv[1])
-    for z, _ in ranked:
-        if z in seen:
-            continue
-        out.append(z)
-        seen.add(z)
-        if len(out) >= max_count:
-            break
-    return ([base_zip] if base_zip else []) + out
+    ranked = heapq.nsmallest(max_count, candidates.items(), key=lambda kv: kv[1])
+    return ([base_zip] if base_zip else []) + [z for z, _ in ranked]
+
+# A next_page_token usually activates well before the documented 2 s; until it
+# does, Google answers INVALID_REQUEST, so poll on a short schedule instead.
+PAGE_TOKEN_DELAYS = (0.4, 0.6, 0.8, 1.2)
+
+def next_page(gmaps: "googlemaps.Client", token: str) -> dict:
+    for attempt, delay in enumerate(PAGE_TOKEN_DELAYS):
+        time.sleep(delay)
+        try:
+            return gmaps.places_nearby(page_token=token)
+        except ApiError as e:
+            if e.status != "INVALID_REQUEST" or attempt == len(PAGE_TOKEN_DELAYS) - 1:
+                raise
 
 def places_nearby_pages(gmaps: "googlemaps.Client", *, location: LatLng, radius: int, open_now: Optional[bool], keyword: Optional[str], max_results: int) -> List[dict]:
     results: List[dict] = []
@@ -93,8 +167,7 @@ def places_nearby_pages(gmaps: "googlemaps.Client", *, location: LatLng, radius:
         results.extend(resp.get("results", []))
         token = resp.get("next_page_token")
         while token and len(results) < max_results:
-            time.sleep(2)
-            resp = gmaps.places_nearby(page_token=token)
+            resp = next_page(gmaps, token)
             results.extend(resp.get("results", []))
             token = resp.get("next_page_token")
             if len(results) >= max_results:
@@ -117,7 +190,7 @@ def filter_unique_with_rating(rows: List[dict], min_rating: float) -> List[dict]
         by_id[pid] = r
     return list(by_id.values())
 
-def weighted_choice(restaurants: Sequence[dict]) -> dict:
+def rating_weights(restaurants: Sequence[dict]) -> List[float]:
     weights = []
     for r in restaurants:
         try:
@@ -125,10 +198,15 @@ def weighted_choice(restaurants: Sequence[dict]) -> dict:
         except Exception:
             w = 1.0
         weights.append(max(w, 0.1))
-    return random.choices(list(restaurants), weights=weights, k=1)[0]
+    return weights
+
+def weighted_choice(restaurants: Sequence[dict], weights: Optional[Sequence[float]] = None) -> dict:
+    if weights is None:
+        weights = rating_weights(restaurants)
+    return random.choices(restaurants, weights=weights, k=1)[0]
 
 def describe_place(p: dict) -> str:
-    name = p.get("name", "<unknown>")
+    name = p.get("name") or "<unknown>"
     rating = p.get("rating")
     reviews = p.get("user_ratings_total")
     price = p.get("price_level")
@@ -170,7 +248,6 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
         print(f"Could not geocode ZIP {base_zip}.")
         return 1
 
-    zip_list = nearby_zips(client, loc, base_zip, max_count=16)
     tried_zips = set()
     suggested_ids = set()
 
@@ -189,48 +266,82 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
         return filter_unique_with_rating(rows, args.min_rating)
 
     if args.non_interactive:
-        results = load_zip(zip_list[0]) if zip_list else []
+        results = load_zip(base_zip)
         if not results:
             print("No restaurants found.")
             return 1
         print(describe_place(weighted_choice(results)))
         return 0
 
-    zip_idx = 0
-    while zip_idx < len(zip_list):
-        z = zip_list[zip_idx]
-        if z in tried_zips:
-            zip_idx += 1
-            continue
-        tried_zips.add(z)
-        restaurants = [r for r in load_zip(z) if r.get("place_id") not in suggested_ids]
-        if not restaurants:
-            print(f"No restaurants found near ZIP {z}. Trying next closest ZIP...")
-            zip_idx += 1
-            continue
+    # A producer thread keeps the next few ZIPs loaded while the user is
+    # swiping, so moving on doesn't block on Google.
+    prefetched: "queue.Queue[Optional[Tuple[str, List[dict]]]]" = queue.Queue(maxsize=3)
+
+    stop = threading.Event()
 
-        remaining = restaurants[:]
-        while remaining:
-            choice = weighted_choice(remaining)
-            print(f"How about: {describe_place(choice)}")
-            ans = input("Yes / No / Details / Quit [y/n/d/q]: ").strip().lower()
-            if ans in ("y", "yes"):
-                print("Great! Enjoy your meal!")
-                return 0
-            if ans in ("q", "quit"):
-                print("Goodbye!")
-                return 0
-            if ans in ("d", "detail", "details"):
-                print(choice)
+    def produce() -> None:
+        try:
+            # Probe neighbouring ZIPs while the starting ZIP's pages (and their
+            # next_page_token waits) are loading.
+            with ThreadPoolExecutor(max_workers=1) as ex:
+                zips_future = ex.submit(nearby_zips, client, loc, base_zip, 16)
+                prefetched.put((base_zip, load_zip(base_zip)))
+                zip_list = zips_future.result()
+            for z in zip_list:
+                if stop.is_set():
+                    return
+                if z != base_zip:
+                    prefetched.put((z, load_zip(z)))
+        except RuntimeError:
+            # Executors refuse new work once the interpreter is exiting.
+            if not stop.is_set():
+                raise
+        finally:
+            prefetched.put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = prefetched.get()
+            if item is None:
+                break
+            z, rows = item
+            if z in tried_zips:
                 continue
-            suggested_ids.add(choice.get("place_id"))
-            remaining = [r for r in remaining if r.get("place_id") not in suggested_ids]
+            tried_zips.add(z)
+            restaurants = [r for r in rows if r.get("place_id") not in suggested_ids]
+            if not restaurants:
+                print(f"No restaurants found near ZIP {z}. Trying next closest ZIP...")
+                continue
+
+            # Weights are computed once per ZIP; rejected places are masked out
+            # by zeroing their weight rather than rebuilding the list.
+            weights = rating_weights(restaurants)
+            left = len(restaurants)
+            while left:
+                i = random.choices(range(len(restaurants)), weights=weights, k=1)[0]
+                choice = restaurants[i]
+                print(f"How about: {describe_place(choice)}")
+                ans = input("Yes / No / Details / Quit [y/n/d/q]: ").strip().lower()
+                if ans in ("y", "yes"):
+                    print("Great! Enjoy your meal!")
+                    return 0
+                if ans in ("q", "quit"):
+                    print("Goodbye!")
+                    return 0
+                if ans in ("d", "detail", "details"):
+                    print(choice)
+                    continue
+                suggested_ids.add(choice.get("place_id"))
+                weights[i] = 0.0
+                left -= 1
 
-        print(f"No more suggestions in {z}. Moving to the next closest ZIP...")
-        zip_idx += 1
+            print(f"No more suggestions in {z}. Moving to the next closest ZIP...")
 
-    print("No more nearby ZIP codes to search. Goodbye!")
-    return 0
+        print("No more nearby ZIP codes to search. Goodbye!")
+        return 0
+    finally:
+        stop.set()
 
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -1,37 +1,124 @@
-from flask import Flask, jsonify, render_template, request, session
-import os, math, time, secrets, requests
+from flask import Flask, Response, jsonify, render_template, request, session, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+import os, math, heapq, time, collections, secrets, hashlib, tempfile, threading, requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import TTLCache
 try:
     import googlemaps
+    from googlemaps.exceptions import ApiError
 except Exception:
     googlemaps = None
+    ApiError = Exception
+try:
+    import numpy as np
+except Exception:
+    np = None
+try:
+    import diskcache
+except Exception:
+    diskcache = None
+try:
+    import orjson
+except Exception:
+    orjson = None
+try:
+    from flask_compress import Compress
+except Exception:
+    Compress = None
 
 app = Flask(__name__, static_url_path="/static", static_folder="static", template_folder="templates")
 app.secret_key = os.getenv("FLASK_SECRET", secrets.token_hex(16))
 
+class OrJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+if orjson is not None: app.json = OrJSONProvider(app)
+
+# JSON and page assets compress well; photos are already-compressed images and are left alone.
+app.config.update(COMPRESS_MIMETYPES=["application/json", "text/html", "text/css", "application/javascript"], COMPRESS_LEVEL=6)
+if Compress is not None: Compress(app)
+PROBE_WORKERS = 8  # concurrent reverse-geocode probes; stays under Google's 10 QPS
+BACKGROUND = ThreadPoolExecutor(max_workers=8)  # overlaps Google calls that don't depend on each other
+
+def pooled_session(max_retries=0):
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=max_retries))
+    return s
+
+# Shared across requests so Google calls and photo proxying reuse TLS connections.
+# googlemaps backs off on 500/503/504 and OVER_QUERY_LIMIT (for up to
+# RETRY_TIMEOUT s); its session retries only what googlemaps doesn't:
+# connection errors, 429 (honouring Retry-After) and 502.
+RETRY_TIMEOUT = 10
+GMAPS_SESSION = pooled_session(Retry(connect=3, status=3, status_forcelist=[429,502], backoff_factor=0.5,
+                                     respect_retry_after_header=True, raise_on_status=False))
+# raise_on_status=False hands the last upstream response back once retries run out.
+PHOTO_SESSION = pooled_session(Retry(total=3, backoff_factor=0.5, status_forcelist=[429,500,502,503,504], raise_on_status=False))
+
+# Photos for a given reference + width don't change, so keep them on disk for a week.
+PHOTO_TTL = 7*86400
+PHOTO_CACHE = diskcache.Cache(os.getenv("PHOTO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "letseat_photos")),
+                              size_limit=2*1024**3) if diskcache else None
+
+# Successful geocodes are shared across sessions; reverse lookups key on
+# coordinates rounded to 4 decimals (~11 m).
+GEO_CACHE_SIZE = 4096
+GEOCODE_CACHE, POSTAL_CACHE = {}, {}
+_cache_lock = threading.Lock()
+
+def _remember(cache, key, value):
+    with _cache_lock:
+        if len(cache) >= GEO_CACHE_SIZE: cache.pop(next(iter(cache)))
+        cache[key] = value
+
+# Swipe state lives server-side; the session cookie only carries deck_id + api_key.
+DECKS = TTLCache(maxsize=10_000, ttl=3600)
+_decks_lock = threading.Lock()
+
+def current_deck():
+    did = session.get("deck_id")
+    if not did: return None
+    with _decks_lock:
+        st = DECKS.get(did)
+        if st is not None: DECKS[did] = st  # re-insert to refresh the TTL
+    return st
+
 def build_client():
     key = request.args.get("api_key") or session.get("api_key") or os.getenv("GOOGLE_MAPS_API_KEY","")
     if not key: raise RuntimeError("Missing API key")
     if googlemaps is None: raise RuntimeError("pip install googlemaps")
     session["api_key"] = key
-    return googlemaps.Client(key=key)
+    return googlemaps.Client(key=key, requests_session=GMAPS_SESSION, retry_timeout=RETRY_TIMEOUT)
 
 def geocode_zip(client, zip_code):
+    ll = GEOCODE_CACHE.get(zip_code)
+    if ll is not None: return ll
     try:
         res = client.geocode(zip_code)
         if not res: return None
         loc = res[0]["geometry"]["location"]
-        return float(loc["lat"]), float(loc["lng"])    
+        ll = float(loc["lat"]), float(loc["lng"])
     except Exception: return None
+    _remember(GEOCODE_CACHE, zip_code, ll)
+    return ll
 
 def reverse_postal(client, lat, lng):
+    key = (round(lat,4), round(lng,4))
+    z = POSTAL_CACHE.get(key)
+    if z is not None: return z
     try:
-        res = client.reverse_geocode((lat,lng), result_type=["postal_code"]) 
+        res = client.reverse_geocode((lat,lng), result_type=["postal_code"])
         if not res: return ""
-        for c in res[0].get("address_components", []):
-            if "postal_code" in c.get("types", []):
-                return c.get("long_name", "") or ""
-        return ""
+        z = next((c.get("long_name", "") or "" for c in res[0].get("address_components", [])
+                  if "postal_code" in c.get("types", [])), "")
     except Exception: return ""
+    if z: _remember(POSTAL_CACHE, key, z)
+    return z
 
 def haversine_m(lat1, lon1, lat2, lon2):
     R, p = 6371000.0, math.pi/180
@@ -39,22 +126,46 @@ def haversine_m(lat1, lon1, lat2, lon2):
     a = math.sin(dlat/2)**2 + math.cos(lat1*p)*math.cos(lat2*p)*math.sin(dlon/2)**2
     return 2*R*math.atan2(math.sqrt(a), math.sqrt(1-a))
 
+def haversine_many_m(lat, lng, points):
+    if np is None or not points:
+        return [haversine_m(lat, lng, la, lo) for la, lo in points]
+    R, p = 6371000.0, math.pi/180
+    pts = np.asarray(points, dtype=np.float64)
+    lats, lons = pts[:,0], pts[:,1]
+    dlat, dlon = (lats-lat)*p, (lons-lng)*p
+    a = np.sin(dlat/2)**2 + math.cos(lat*p)*np.cos(lats*p)*np.sin(dlon/2)**2
+    return (2*R*np.arctan2(np.sqrt(a), np.sqrt(1-a))).tolist()
+
 def nearby_zips(client, center, base_zip, max_count=12):
     lat, lng = center
     seen = set([base_zip]) if base_zip else set()
     candidates = {}
-    for miles in (5.0, 10.0):
+    def ring(miles):
         dlat = miles/69.0
         dlon = miles/(69.0*max(math.cos(lat*math.pi/180), 0.0001))
-        for la, lo in [(lat+dlat,lng),(lat-dlat,lng),(lat,lng+dlon),(lat,lng-dlon),
-                       (lat+dlat,lng+dlon),(lat+dlat,lng-dlon),(lat-dlat,lng+dlon),(lat-dlat,lng-dlon)]:
-            z = reverse_postal(client, la, lo)
-            if not z: continue
-            d = haversine_m(lat,lng,la,lo)
+        return [(lat+dlat,lng),(lat-dlat,lng),(lat,lng+dlon),(lat,lng-dlon),
+                (lat+dlat,lng+dlon),(lat+dlat,lng-dlon),(lat-dlat,lng+dlon),(lat-dlat,lng-dlon)]
+    offsets = ring(5.0) + ring(10.0)
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as ex:
+        zips = ex.map(lambda p: reverse_postal(client, *p), offsets)
+        for z, d in zip(zips, haversine_many_m(lat, lng, offsets)):
+            if not z or z in seen: continue
             if z not in candidates or d < candidates[z]:
                 candidates[z] = d
-    ordered = [z for z,_ in sorted(candidates.items(), key=lambda kv: kv[1])]
-    return ([base_zip] if base_zip else []) + [z for z in ordered if z not in seen][:max_count]
+    ordered = [z for z,_ in heapq.nsmallest(max_count, candidates.items(), key=lambda kv: kv[1])]
+    return ([base_zip] if base_zip else []) + ordered
+
+# A next_page_token usually activates well before the documented 2 s; until it
+# does, Google answers INVALID_REQUEST, so poll on a short schedule instead.
+PAGE_TOKEN_DELAYS = (0.4, 0.6, 0.8, 1.2)
+
+def next_page(client, token):
+    for attempt, delay in enumerate(PAGE_TOKEN_DELAYS):
+        time.sleep(delay)
+        try:
+            return client.places_nearby(page_token=token)
+        except ApiError as e:
+            if e.status != "INVALID_REQUEST" or attempt == len(PAGE_TOKEN_DELAYS)-1: raise
 
 def places_nearby_pages(client, *, location, radius, open_now, keyword, max_results=60):
     out, token = [], None
@@ -62,7 +173,7 @@ def places_nearby_pages(client, *, location, radius, open_now, keyword, max_resu
         resp = client.places_nearby(location=location, radius=radius, type="restaurant", open_now=open_now, keyword=keyword)
         out.extend(resp.get("results", [])); token = resp.get("next_page_token")
         while token and len(out) < max_results:
-            time.sleep(2); resp = client.places_nearby(page_token=token)
+            resp = next_page(client, token)
             out.extend(resp.get("results", [])); token = resp.get("next_page_token")
     except Exception as e:
         app.logger.warning("places error: %s", e)
@@ -73,9 +184,42 @@ def filter_unique_with_rating(rows, min_rating):
     for r in rows:
         pid = r.get("place_id"); rating = float(r.get("rating") or 0)
         if not pid or rating < min_rating: continue
-        by_id[pid] = r
+        # Keep only the fields /api/next serves; raw Places rows carry 20+.
+        loc = (r.get("geometry") or {}).get("location") or {}
+        by_id[pid] = {
+            "id": pid, "name": r.get("name"), "rating": r.get("rating"),
+            "reviews": r.get("user_ratings_total"), "price": r.get("price_level"),
+            "address": r.get("vicinity") or r.get("formatted_address"),
+            "photo_ref": (r.get("photos") or [{}])[0].get("photo_reference"),
+            "lat": loc.get("lat"), "lng": loc.get("lng"),
+        }
     return list(by_id.values())
 
+# Concurrent requests for the same ZIP and filters share one upstream fetch.
+INFLIGHT = {}
+_inflight_lock = threading.Lock()
+
+def load_zip(client, zip_code, *, radius, open_now, keyword, min_rating):
+    key = (zip_code, radius, bool(open_now), keyword, min_rating)
+    with _inflight_lock:
+        fut = INFLIGHT.get(key)
+        owner = fut is None
+        if owner: fut = INFLIGHT[key] = Future()
+    if not owner:
+        return fut.result()
+    try:
+        loc = geocode_zip(client, zip_code)
+        rows = None
+        if loc:
+            rows = places_nearby_pages(client, location=loc, radius=radius, open_now=open_now or None, keyword=keyword, max_results=60)
+            rows = filter_unique_with_rating(rows, min_rating)
+        fut.set_result(rows)
+        return rows
+    except BaseException as e:
+        fut.set_exception(e); raise
+    finally:
+        with _inflight_lock: INFLIGHT.pop(key, None)
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -92,80 +236,86 @@ def api_start():
     loc = geocode_zip(client, zip_code)
     if not loc:
         return jsonify({"error":"invalid_zip"}), 400
-    rows = places_nearby_pages(client, location=loc, radius=radius, open_now=open_now or None, keyword=keyword, max_results=60)
-    rows = filter_unique_with_rating(rows, min_rating)
-    zips = nearby_zips(client, loc, zip_code, max_count=16)
-    session.update({
-        "deck": rows, "idx": 0, "suggested": set(), "likes": [],
-        "zip": zip_code, "zip_queue": zips[1:], "tried_zips": [],
-        "radius": radius, "min_rating": min_rating, "open_now": open_now, "keyword": keyword,
-    })
+    # Probe neighbouring ZIPs while the Places pages (and their token waits) load.
+    zips_future = BACKGROUND.submit(nearby_zips, client, loc, zip_code, 16)
+    rows = load_zip(client, zip_code, radius=radius, open_now=open_now, keyword=keyword, min_rating=min_rating) or []
+    zips = zips_future.result()
+    did = secrets.token_urlsafe(16)
+    with _decks_lock:
+        DECKS[did] = {
+            "lock": threading.Lock(), "deck": collections.deque(rows), "suggested": set(), "likes": [],
+            "zip": zip_code, "zip_queue": collections.deque(zips[1:]), "tried_zips": set(), "expanded": False,
+            "radius": radius, "min_rating": min_rating, "open_now": open_now, "keyword": keyword,
+        }
+    session["deck_id"] = did
     return jsonify({"ok": True})
 
+# ZIPs one /api/next may move through before it hands back to the client, so a
+# filter that matches nothing can't hold a request open or burn quota unbounded.
+MAX_REFILLS = 3
+
 @app.get("/api/next")
 def api_next():
-    # If deck exhausted, try auto-advance to next ZIP
-    def refill_from_next_zip():
-        tried = set(session.get("tried_zips", [])) | {session.get("zip")}
-        queue = [z for z in session.get("zip_queue", []) if z not in tried]
-        if not queue:
-            # try recomputing once
+    st = current_deck()
+    if st is None:
+        return jsonify({"done": True})
+
+    # Hold the deck for the whole request: a double-click fires two /api/next
+    # calls, which would otherwise both pop the last card or the same ZIP.
+    with st["lock"]:
+        # If deck exhausted, try auto-advance to next ZIP
+        def refill_from_next_zip():
+            tried, queue = st["tried_zips"], st["zip_queue"]
+            tried.add(st.get("zip"))
+            while queue and queue[0] in tried: queue.popleft()
+            if not queue and not st["expanded"]:
+                # try recomputing once
+                st["expanded"] = True
+                client = build_client()
+                curr = st.get("zip")
+                if curr:
+                    loc = geocode_zip(client, curr)
+                    if loc:
+                        zips = nearby_zips(client, loc, curr, max_count=16)
+                        queue.extend(z for z in zips[1:] if z not in tried)
+            if not queue:
+                return False
+            nxt = st["zip"] = queue.popleft()
             client = build_client()
-            curr = session.get("zip")
-            if curr:
-                loc = geocode_zip(client, curr)
-                if loc:
-                    zips = nearby_zips(client, loc, curr, max_count=16)
-                    queue = [z for z in zips[1:] if z not in tried]
-        if not queue:
-            return False
-        nxt = queue[0]
-        session["zip_queue"] = queue[1:]
-        session["tried_zips"] = list(tried)
-        session["zip"] = nxt
-        client = build_client()
-        loc = geocode_zip(client, nxt)
-        if not loc:
-            return False
-        rows = places_nearby_pages(client, location=loc, radius=int(session.get("radius",5000)), open_now=session.get("open_now") or None, keyword=session.get("keyword"), max_results=60)
-        rows = filter_unique_with_rating(rows, float(session.get("min_rating",0)))
-        session["deck"] = rows
-        session["idx"] = 0
-        session["suggested"] = set()
-        return True
-
-    deck = session.get("deck", []); idx = int(session.get("idx", 0))
-    sugg = set(session.get("suggested", []))
-    while idx < len(deck) and (deck[idx].get("place_id") in sugg):
-        idx += 1
-    if idx >= len(deck):
-        if refill_from_next_zip():
-            deck = session.get("deck", []); idx = int(session.get("idx", 0))
-        else:
-            return jsonify({"done": True})
-    session["idx"] = idx + 1
-    p = deck[idx]
-    info = {
-        "id": p.get("place_id"), "name": p.get("name"), "rating": p.get("rating"),
-        "reviews": p.get("user_ratings_total"), "price": p.get("price_level"),
-        "address": p.get("vicinity") or p.get("formatted_address"),
-        "photo_ref": (p.get("photos") or [{}])[0].get("photo_reference"),
-        "lat": ((p.get("geometry") or {}).get("location") or {}).get("lat"),
-        "lng": ((p.get("geometry") or {}).get("location") or {}).get("lng"),
-        "zip": session.get("zip"),
-    }
-    return jsonify(info)
+            if queue:
+                BACKGROUND.submit(geocode_zip, client, queue[0])  # warm the cache for the next refill
+            rows = load_zip(client, nxt, radius=int(st.get("radius",5000)), open_now=st.get("open_now"),
+                            keyword=st.get("keyword"), min_rating=float(st.get("min_rating",0)))
+            if rows is None:
+                return False
+            st["deck"] = collections.deque(rows)
+            return True
+
+        # Cards are popped as they're served; suggested spans ZIPs so overlapping
+        # search areas don't repeat places.
+        sugg = st["suggested"]
+        for refills in range(MAX_REFILLS + 1):
+            deck = st["deck"]
+            while deck and deck[0]["id"] in sugg: deck.popleft()
+            if deck: break
+            if refills == MAX_REFILLS:
+                return jsonify({"pending": True, "zip": st.get("zip")})
+            if not refill_from_next_zip():
+                return jsonify({"done": True})
+        info = dict(deck.popleft(), zip=st.get("zip"))
+        return jsonify(info)
 
 @app.post("/api/swipe")
 def api_swipe():
+    st = current_deck()
+    if st is None:
+        return jsonify({"error":"no_deck"}), 400
     data = request.get_json(force=True)
     pid = data.get("id"); direction = data.get("dir")  # "left" or "right"
-    sugg = set(session.get("suggested", []))
-    if pid: sugg.add(pid)
-    session["suggested"] = list(sugg)
-    if direction == "right":
-        likes = list(session.get("likes", []))
-        likes.append(pid); session["likes"] = likes
+    with st["lock"]:
+        if pid: st["suggested"].add(pid)
+        if direction == "right":
+            st.setdefault("likes", []).append(pid)
     return jsonify({"ok": True})
 
 @app.get("/api/photo")
@@ -173,9 +323,36 @@ def api_photo():
     key = session.get("api_key")
     ref = request.args.get("ref"); width = request.args.get("w","900")
     if not (key and ref): return ("", 404)
+    ck = f"{ref}:{width}"
+    etag = hashlib.sha1(ck.encode()).hexdigest()
+    cache_headers = {"Cache-Control": f"public, max-age={PHOTO_TTL}, immutable", "ETag": f'"{etag}"'}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=cache_headers)
+    hit = PHOTO_CACHE.get(ck) if PHOTO_CACHE is not None else None
+    if hit:
+        ctype, body = hit
+        return Response(body, headers={"Content-Type": ctype, **cache_headers})
     url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth={width}&photoreference={ref}&key={key}"
-    r = requests.get(url, stream=True, timeout=10)
-    return (r.content, r.status_code, {"Content-Type": r.headers.get("Content-Type","image/jpeg")})
+    try:
+        r = PHOTO_SESSION.get(url, stream=True, timeout=10)
+    except requests.RequestException:
+        return ("", 502)
+    ctype = r.headers.get("Content-Type","image/jpeg")
+    headers = {"Content-Type": ctype}
+    if r.status_code == 200: headers.update(cache_headers)
+    if r.headers.get("Last-Modified"): headers["Last-Modified"] = r.headers["Last-Modified"]
+    # Relay the image in chunks instead of buffering the whole body first,
+    # keeping a copy for the disk cache when the fetch succeeds.
+    def relay():
+        buf = [] if PHOTO_CACHE is not None and r.status_code == 200 else None
+        for chunk in r.iter_content(chunk_size=64*1024):
+            if buf is not None: buf.append(chunk)
+            yield chunk
+        if buf is not None:
+            PHOTO_CACHE.set(ck, (ctype, b"".join(buf)), expire=PHOTO_TTL)
+    resp = Response(stream_with_context(relay()), status=r.status_code, headers=headers)
+    resp.call_on_close(r.close)
+    return resp
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=False)
@@ -1,124 +1,251 @@
-import math, os, time
-from io import BytesIO
+import functools, heapq, itertools, math, os, random, time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Sequence, Tuple
-import requests, streamlit as st
+import numpy as np, requests, streamlit as st
 
 try:
     import googlemaps
 except Exception:
     googlemaps = None
+try:
+    import diskcache
+except Exception:
+    diskcache = None
 
 LatLng = Tuple[float, float]
 
+# st.rerun replaced st.experimental_rerun (since removed); resolve once at import.
+_RERUN = getattr(st, "rerun", None) or getattr(st, "experimental_rerun", None)
+
+def _rerun() -> None:
+    if _RERUN: _RERUN()
+
+# googlemaps' default 60 s retry budget stalls the probe and prefetch threads.
+RETRY_TIMEOUT = 10
+
+# One client per key, kept across reruns so its connection pool stays warm.
+# Sized for the reverse-geocode probes plus the prefetch pool.
+@st.cache_resource(show_spinner=False)
+def _gmaps_client(api_key: str) -> "googlemaps.Client":
+    s = requests.Session()
+    s.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return googlemaps.Client(key=api_key, timeout=10, retry_timeout=RETRY_TIMEOUT, requests_session=s)
+
 def build_client(api_key: str) -> "googlemaps.Client":
     if not api_key: raise ValueError("Missing API key")
     if googlemaps is None: raise RuntimeError("pip install googlemaps")
-    return googlemaps.Client(key=api_key)
+    return _gmaps_client(api_key)
+
+# st.cache_data is lost on restart, so lookups are also persisted to disk (when
+# diskcache is installed) under $CACHE_DIR, keyed on the function name and its
+# arguments minus the client. Errors and None results are never stored.
+@st.cache_resource(show_spinner=False)
+def _disk_cache() -> Optional["diskcache.Cache"]:
+    return diskcache.Cache(os.getenv("CACHE_DIR", ".cache"), size_limit=512*1024**2) if diskcache else None
+
+def _disk_get(key: tuple):
+    cache = _disk_cache()
+    return cache.get(key) if cache is not None else None
+
+def _disk_set(key: tuple, value, expire: float) -> None:
+    cache = _disk_cache()
+    if cache is not None and value is not None: cache.set(key, value, expire=expire)
+
+def disk_cached(expire: float):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(_gmaps, *args):
+            key = (fn.__name__,) + args
+            hit = _disk_get(key)
+            if hit is not None: return hit
+            value = fn(_gmaps, *args)
+            _disk_set(key, value, expire)
+            return value
+        return wrapper
+    return deco
+
+# Geocoding results are stable, so cache them for a day. The client is passed as
+# _gmaps so Streamlit leaves it out of the cache key; API errors propagate out
+# of the cached functions and are therefore never cached.
+@st.cache_data(ttl=86400, show_spinner=False)
+@disk_cached(expire=86400)
+def _geocode_cached(_gmaps: "googlemaps.Client", zip_code: str) -> Optional[LatLng]:
+    res = _gmaps.geocode(zip_code)
+    if not res: return None
+    loc = res[0]["geometry"]["location"]
+    return float(loc["lat"]), float(loc["lng"])
+
+@st.cache_data(ttl=86400, show_spinner=False)
+@disk_cached(expire=86400)
+def _reverse_postal_cached(_gmaps: "googlemaps.Client", lat: float, lng: float) -> str:
+    res = _gmaps.reverse_geocode((lat, lng), result_type=["postal_code"])
+    if not res: return ""
+    comps = res[0].get("address_components") or ()
+    return next((c.get("long_name", "") or "" for c in comps if "postal_code" in c.get("types", ())), "")
 
 def geocode_zip(gmaps: "googlemaps.Client", zip_code: str) -> Optional[LatLng]:
     try:
-        res = gmaps.geocode(zip_code)
-        if not res: return None
-        loc = res[0]["geometry"]["location"]
-        return float(loc["lat"]), float(loc["lng"])
+        return _geocode_cached(gmaps, zip_code.strip())
     except Exception:
         return None
 
 def reverse_postal(gmaps: "googlemaps.Client", lat: float, lng: float) -> str:
+    # Snap to ~100 m so nearby probe points share a cache entry.
     try:
-        res = gmaps.reverse_geocode((lat, lng), result_type=["postal_code"])
-        if not res: return ""
-        for c in res[0].get("address_components", []):
-            if "postal_code" in c.get("types", []):
-                return c.get("long_name", "") or ""
-        return ""
+        return _reverse_postal_cached(gmaps, round(lat, 3), round(lng, 3))
     except Exception:
         return ""
 
-def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R, p = 6371000.0, math.pi/180
-    dlat, dlon = (lat2-lat1)*p, (lon2-lon1)*p
-    a = math.sin(dlat/2)**2 + math.cos(lat1*p)*math.cos(lat2*p)*math.sin(dlon/2)**2
-    return 2*R*math.atan2(math.sqrt(a), math.sqrt(1-a))
+EARTH_R, DEG = 6371000.0, math.pi/180
+
+def _hav_rad(latr: float, lngr: float, clat: float, latsr: np.ndarray, lngsr: np.ndarray) -> np.ndarray:
+    # Haversine from one center to many points, all in radians; arcsin(sqrt(a))
+    # equals atan2(sqrt(a), sqrt(1-a)) for a <= 1 and skips a sqrt and the atan2.
+    a = np.sin((latsr-latr)/2)**2 + clat*np.cos(latsr)*np.sin((lngsr-lngr)/2)**2
+    return 2*EARTH_R*np.arcsin(np.sqrt(a))
 
 def nearby_zips(gmaps: "googlemaps.Client", center: LatLng, base_zip: str, max_count: int = 12) -> List[str]:
     lat, lng = center
     seen = set([base_zip]) if base_zip else set()
     candidates = {}
-    for miles in (5.0, 10.0):
-        dlat = miles/69.0
-        dlon = miles/(69.0*max(math.cos(lat*math.pi/180), 0.0001))
-        for la, lo in [(lat+dlat,lng),(lat-dlat,lng),(lat,lng+dlon),(lat,lng-dlon),
-                       (lat+dlat,lng+dlon),(lat+dlat,lng-dlon),(lat-dlat,lng+dlon),(lat-dlat,lng-dlon)]:
-            z = reverse_postal(gmaps, la, lo)
-            if not z: continue
-            d = haversine_m(lat,lng,la,lo)
-            if z not in candidates or d < candidates[z]: candidates[z] = d
-    ordered = [z for z,_ in sorted(candidates.items(), key=lambda kv: kv[1])]
-    return ([base_zip] if base_zip else []) + [z for z in ordered if z not in seen][:max_count]
-
-def places_nearby_pages(gmaps: "googlemaps.Client", *, location: LatLng, radius: int, open_now: Optional[bool], keyword: Optional[str], max_results: int) -> List[dict]:
+    latr, lngr = lat*DEG, lng*DEG
+    clat = math.cos(latr)
+    # Compass points at 5 mi plus diagonals at 10 mi: adjacent probes on a full
+    # 16-point grid mostly land in the same ZIP.
+    d5, d10 = 5.0/69.0, 10.0/69.0
+    e5, e10 = d5/max(clat, 0.0001), d10/max(clat, 0.0001)
+    coords: List[LatLng] = [(lat+d5,lng),(lat-d5,lng),(lat,lng+e5),(lat,lng-e5),
+                            (lat+d10,lng+e10),(lat+d10,lng-e10),(lat-d10,lng+e10),(lat-d10,lng-e10)]
+    # The probes are independent round-trips; 8 workers stays under Google's 10 QPS.
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        zips = list(ex.map(lambda p: reverse_postal(gmaps, *p), coords))
+    pts = np.radians(coords)
+    dists = _hav_rad(latr, lngr, clat, pts[:,0], pts[:,1]).tolist()
+    for z, d in zip(zips, dists):
+        if not z or z in seen: continue
+        if z not in candidates or d < candidates[z]: candidates[z] = d
+    ordered = [z for z,_ in heapq.nsmallest(max_count, candidates.items(), key=lambda kv: kv[1])]
+    return ([base_zip] if base_zip else []) + ordered
+
+# Returns (rows, error message). This also runs on prefetch threads, where st.*
+# calls are dropped, so the caller shows the error instead.
+def places_nearby_pages(gmaps: "googlemaps.Client", *, location: LatLng, radius: int, open_now: Optional[bool],
+                        keyword: Optional[str], max_results: int) -> Tuple[List[dict], Optional[str]]:
+    # open_now results go stale quickly, so they only persist for a few minutes.
+    key = ("places_nearby_pages", tuple(location), radius, open_now, keyword, max_results)
+    hit = _disk_get(key)
+    if hit is not None: return hit, None
     out, token = [], None
     try:
+        # A token activates ~2 s after it is issued, so wait out the rest of
+        # that window rather than a fresh 2 s after our own processing.
         resp = gmaps.places_nearby(location=location, radius=radius, type="restaurant", open_now=open_now, keyword=keyword)
+        ready = time.monotonic() + 2
         out.extend(resp.get("results", [])); token = resp.get("next_page_token")
         while token and len(out) < max_results:
-            time.sleep(2); resp = gmaps.places_nearby(page_token=token)
+            time.sleep(max(0.0, ready - time.monotonic())); resp = gmaps.places_nearby(page_token=token)
+            ready = time.monotonic() + 2
             out.extend(resp.get("results", [])); token = resp.get("next_page_token")
     except Exception as e:
-        st.warning(f"Places error: {e}")
-    return out[:max_results]
+        return out[:max_results], f"Places error: {e}"
+    _disk_set(key, out[:max_results], expire=600 if open_now else 86400)
+    return out[:max_results], None
+
+def fetch_zip_places(gmaps: "googlemaps.Client", zip_code: str, *, radius: int, open_now: Optional[bool],
+                     keyword: Optional[str], min_rating: float) -> Tuple[List[dict], Optional[str]]:
+    loc = geocode_zip(gmaps, zip_code)
+    if not loc: return [], None
+    rows, err = places_nearby_pages(gmaps, location=loc, radius=radius, open_now=open_now, keyword=keyword, max_results=60)
+    return filter_unique_with_rating(rows, min_rating), err
+
+# Upcoming ZIPs are fetched in the background so advancing doesn't block on
+# Places pagination; their 2 s page-token waits overlap with each other.
+PREFETCH_ZIPS = 4
+
+@st.cache_resource(show_spinner=False)
+def _prefetch_pool() -> ThreadPoolExecutor:
+    # Room for the prefetched ZIPs plus upcoming cards' images.
+    return ThreadPoolExecutor(max_workers=PREFETCH_ZIPS + 4)
+
+def prefetch_zips(gmaps: "googlemaps.Client", queue: Sequence[str]) -> None:
+    futures = st.session_state.setdefault("zip_futures", {})
+    for z in queue[:PREFETCH_ZIPS]:
+        if z not in futures:
+            futures[z] = _prefetch_pool().submit(
+                fetch_zip_places, gmaps, z, radius=st.session_state["radius"],
+                open_now=st.session_state["open_now"] or None, keyword=st.session_state["keyword"],
+                min_rating=st.session_state["min_rating"])
 
 def filter_unique_with_rating(rows: List[dict], min_rating: float) -> List[dict]:
-    by_id = {}
+    # Single pass; keeps Places' prominence order and the first copy of each place.
+    seen, out = set(), []
     for r in rows:
-        pid = r.get("place_id"); rating = float(r.get("rating") or 0)
-        if not pid or rating < min_rating: continue
-        by_id[pid] = r
-    return list(by_id.values())
+        pid = r.get("place_id")
+        if not pid or pid in seen: continue
+        if (r.get("rating") or 0) < min_rating: continue
+        seen.add(pid); out.append(r)
+    return out
 
 def weighted_choice(rows: Sequence[dict]) -> dict:
-    import random
     ws = []
     for r in rows:
         try: ws.append(max(float(r.get("rating") or 1.0), 0.1))
-        except: ws.append(1.0)
+        except (TypeError, ValueError): ws.append(1.0)
     return random.choices(list(rows), weights=ws, k=1)[0]
 
+@st.cache_resource(show_spinner=False)
+def _http_session() -> requests.Session:
+    # One keep-alive pool for image downloads, shared across reruns.
+    s = requests.Session()
+    s.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16))
+    return s
+
+# Image bytes are cached by photo reference / rounded coordinates rather than by
+# the place dict. The key is passed as _api_key so it stays out of the cache
+# key; failed downloads raise and are therefore not cached.
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _photo_bytes_by_ref(_api_key: str, ref: str) -> bytes:
+    url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=900&photoreference={ref}&key={_api_key}"
+    r = _http_session().get(url, timeout=10)
+    r.raise_for_status()
+    return r.content
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _static_map_by_coords(_api_key: str, lat: float, lng: float) -> bytes:
+    url = ("https://maps.googleapis.com/maps/api/staticmap"
+           f"?center={lat},{lng}&zoom=15&size=640x320&scale=2&markers=color:red|{lat},{lng}&key={_api_key}")
+    r = _http_session().get(url, timeout=10)
+    r.raise_for_status()
+    return r.content
+
 def photo_bytes(api_key: str, place: dict) -> Optional[bytes]:
     photos = place.get("photos") or []
     if not photos: return None
     ref = photos[0].get("photo_reference")
     if not ref: return None
-    url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=900&photoreference={ref}&key={api_key}"
-    try:
-        r = requests.get(url, timeout=10)
-        if r.ok: return r.content
-    except Exception: pass
-    return None
+    try: return _photo_bytes_by_ref(api_key, ref)
+    except Exception: return None
 
 def static_map_bytes(api_key: str, place: dict) -> Optional[bytes]:
     geo = (place.get("geometry") or {}).get("location") or {}
     lat, lng = geo.get("lat"), geo.get("lng")
     if lat is None or lng is None: return None
-    url = ("https://maps.googleapis.com/maps/api/staticmap"
-           f"?center={lat},{lng}&zoom=15&size=640x320&scale=2&markers=color:red|{lat},{lng}&key={api_key}")
-    try:
-        r = requests.get(url, timeout=10)
-        if r.ok: return r.content
-    except Exception: pass
-    return None
+    try: return _static_map_by_coords(api_key, round(lat, 4), round(lng, 4))
+    except Exception: return None
+
+def card_images(api_key: str, place: dict) -> Tuple[Optional[bytes], Optional[bytes]]:
+    # Photo and static map are independent downloads; fetch them side by side.
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_img, f_map = ex.submit(photo_bytes, api_key, place), ex.submit(static_map_bytes, api_key, place)
+        return f_img.result(), f_map.result()
 
 def describe_place(p: dict) -> str:
     name = p.get("name","<unknown>"); rating = p.get("rating"); rev = p.get("user_ratings_total")
     price = p.get("price_level"); addr = p.get("vicinity") or p.get("formatted_address") or ""
     price_str = "?" if price is None else "$"*int(price)
-    bits = [name]
-    if rating is not None: bits.append(f"{rating}★")
-    if rev is not None: bits.append(f"({rev} reviews)")
-    bits.append(price_str)
-    if addr: bits.append(addr)
-    return " — ".join(bits)
+    bits = (name, None if rating is None else f"{rating}★", None if rev is None else f"({rev} reviews)",
+            price_str, addr or None)
+    return " — ".join(b for b in bits if b is not None)
 
 st.set_page_config(page_title="Let's Eat", page_icon="🍽️", layout="centered")
 st.markdown("""
@@ -138,24 +265,32 @@ with st.sidebar:
         min_rating = st.slider("Min rating", 0.0, 5.0, float(st.session_state.get("min_rating", 0.0)), 0.1)
     with colB:
         radius = st.number_input("Radius (m)", 500, 25000, int(st.session_state.get("radius", 5000)), 500)
-        keyword = st.text_input("Keyword", value=st.session_state.get("keyword",""))
+        keyword = st.text_input("Keyword", value=st.session_state.get("keyword") or "")
     if st.button("Start" if "started" not in st.session_state else "Restart", use_container_width=True):
         try: client = build_client(api_key)
         except Exception as e: st.error(f"API key error: {e}"); st.stop()
         loc = geocode_zip(client, zip_code.strip())
         if not loc: st.error(f"Could not geocode ZIP {zip_code}."); st.stop()
-        zips = nearby_zips(client, loc, zip_code.strip(), max_count=16)
+        # Drop the previous run's speculative fetches so they don't hold the pool.
+        for f in itertools.chain(st.session_state.get("zip_futures", {}).values(), st.session_state.get("img_cache", {}).values()):
+            f.cancel()
+        # The nearby-ZIP probes and the first ZIP's Places pages only need the
+        # center, so probe in the background while this thread paginates.
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            zips_fut = ex.submit(nearby_zips, client, loc, zip_code.strip(), max_count=8)
+            rows, err = places_nearby_pages(client, location=loc, radius=int(radius), open_now=open_now or None,
+                                            keyword=keyword or None, max_results=60)
+            zips = zips_fut.result()
         st.session_state.update({
             "started": True, "api_key": api_key, "zip": zip_code.strip(),
-            "zip_queue": zips[1:], "tried_zips": [], "suggested_ids": set(), "likes": [],
+            "all_zips": zips, "expanded_zips": {zip_code.strip()}, "tried_zips": set(), "suggested_ids": set(), "likes": [],
             "open_now": open_now, "min_rating": float(min_rating),
-            "radius": int(radius), "keyword": keyword.strip() or None,
+            "radius": int(radius), "keyword": keyword.strip() or None, "zip_futures": {}, "img_cache": {},
         })
-        rows = places_nearby_pages(client, location=loc, radius=int(radius), open_now=open_now or None,
-                                   keyword=keyword or None, max_results=60)
+        prefetch_zips(client, zips[1:])
         st.session_state["places"] = filter_unique_with_rating(rows, float(min_rating))
-        st.session_state["idx"] = 0
-        st.experimental_rerun()
+        st.session_state["idx"] = 0; st.session_state["places_error"] = err
+        _rerun()
 
 def ensure_client() -> Optional["googlemaps.Client"]:
     key = st.session_state.get("api_key","")
@@ -164,58 +299,77 @@ def ensure_client() -> Optional["googlemaps.Client"]:
     except Exception: return None
 
 def advance_zip():
-    st.session_state["tried_zips"] = list(set(st.session_state.get("tried_zips",[])) | {st.session_state.get("zip")})
-    queue = [z for z in st.session_state.get("zip_queue",[]) if z not in st.session_state["tried_zips"]]
-    if not queue:
-        client = ensure_client()
-        if client and st.session_state.get("zip"):
-            loc = geocode_zip(client, st.session_state["zip"])
-            if loc:
-                zips = nearby_zips(client, loc, st.session_state["zip"], max_count=16)
-                queue = [z for z in zips[1:] if z not in st.session_state["tried_zips"]]
+    tried = st.session_state.setdefault("tried_zips", set()); tried.add(st.session_state.get("zip"))
+    client = ensure_client()
+    # all_zips is every ZIP the 8 probes around Start found (hence max_count=8).
+    # Only when all of them are tried does the search widen, around the current
+    # ZIP and never the same center twice.
+    all_zips, expanded = st.session_state.setdefault("all_zips", []), st.session_state.setdefault("expanded_zips", set())
+    queue = [z for z in all_zips if z not in tried]
+    curr = st.session_state.get("zip")
+    if not queue and curr and curr not in expanded:
+        expanded.add(curr)
+        loc = geocode_zip(client, curr) if client else None
+        if loc:
+            all_zips.extend(z for z in nearby_zips(client, loc, curr, max_count=8)[1:] if z not in all_zips)
+            queue = [z for z in all_zips if z not in tried]
     if not queue:
         st.session_state["places"] = []; st.session_state["idx"] = 0; return False
-    nxt = queue[0]; st.session_state["zip_queue"] = queue[1:]; st.session_state["zip"] = nxt
-    client = ensure_client()
-    if client:
-        loc = geocode_zip(client, nxt)
-        rows = places_nearby_pages(client, location=loc, radius=st.session_state["radius"],
-                                   open_now=st.session_state["open_now"] or None,
-                                   keyword=st.session_state["keyword"], max_results=60) if loc else []
-        rows = filter_unique_with_rating(rows, st.session_state["min_rating"])
-    else: rows = []
-    st.session_state["places"] = rows; st.session_state["idx"] = 0; return True
+    nxt = queue[0]; st.session_state["zip"] = nxt
+    # Queue the following ZIPs first so their pagination runs during ours.
+    if client: prefetch_zips(client, queue[1:])
+    fut = st.session_state.setdefault("zip_futures", {}).pop(nxt, None)
+    res = None
+    if fut:
+        try: res = fut.result(timeout=10)
+        except Exception: res = None
+    if res is None:
+        res = fetch_zip_places(client, nxt, radius=st.session_state["radius"],
+                               open_now=st.session_state["open_now"] or None, keyword=st.session_state["keyword"],
+                               min_rating=st.session_state["min_rating"]) if client else ([], None)
+    st.session_state["places"], st.session_state["places_error"] = res
+    st.session_state["idx"] = 0; return True
 
 st.title("Let's Eat 🍽️")
 if not st.session_state.get("started"):
     st.info("Enter your API key and starting ZIP in the sidebar, then click Start."); st.stop()
 
+# Set by Start/advance_zip, which rerun straight away; show it on the next run.
+err = st.session_state.pop("places_error", None)
+if err: st.warning(err)
+
 places = st.session_state.get("places", []); idx = int(st.session_state.get("idx", 0))
-likes = st.session_state.get("likes", []); suggested = st.session_state.get("suggested_ids", set())
+likes = st.session_state.get("likes", []); suggested = st.session_state.setdefault("suggested_ids", set())
 
 if idx >= len(places):
     st.warning("No more suggestions in this ZIP.")
-    if advance_zip(): st.success(f"Switched to next ZIP: {st.session_state.get('zip')}"); st.experimental_rerun()
+    if advance_zip(): st.success(f"Switched to next ZIP: {st.session_state.get('zip')}"); _rerun()
     else: st.error("No more nearby ZIP codes to search."); st.stop()
 
 place = places[idx]; pid = place.get("place_id")
-if pid in suggested: st.session_state["idx"] = idx + 1; st.experimental_rerun()
+if pid in suggested: st.session_state["idx"] = idx + 1; _rerun()
 
 st.markdown('<div class="fade-enter">', unsafe_allow_html=True)
-img = photo_bytes(st.session_state["api_key"], place)
-if img: st.image(BytesIO(img), use_column_width=True)
-m = static_map_bytes(st.session_state["api_key"], place)
-if m: st.image(BytesIO(m), use_column_width=True, caption="Map preview")
+# Images for the next couple of cards download in the background, so a click
+# usually renders the next card without waiting on the network.
+img_cache = st.session_state.setdefault("img_cache", {})
+fut = img_cache.pop(pid, None)
+img, m = fut.result() if fut else card_images(st.session_state["api_key"], place)
+for nxt in places[idx+1:idx+3]:
+    if nxt.get("place_id") not in img_cache and nxt.get("place_id") not in suggested:
+        img_cache[nxt.get("place_id")] = _prefetch_pool().submit(card_images, st.session_state["api_key"], nxt)
+if img: st.image(img, use_container_width=True)
+if m: st.image(m, use_container_width=True, caption="Map preview")
 st.subheader(place.get("name","")); st.caption(describe_place(place))
 col1, col2, col3 = st.columns([1,1,1])
 with col1:
     if st.button("👎 Nope", use_container_width=True):
-        suggested.add(pid); st.session_state["suggested_ids"] = suggested; st.session_state["idx"] = idx + 1; st.experimental_rerun()
+        suggested.add(pid); st.session_state["idx"] = idx + 1; _rerun()
 with col2: st.write(" ")
 with col3:
     if st.button("👍 Like", use_container_width=True):
-        suggested.add(pid); st.session_state["suggested_ids"] = suggested
-        st.session_state["likes"] = likes + [place]; st.session_state["idx"] = idx + 1; st.experimental_rerun()
+        suggested.add(pid)
+        st.session_state["likes"] = likes + [place]; st.session_state["idx"] = idx + 1; _rerun()
 
 with st.expander(f"Liked ({len(likes)})", expanded=False):
     for p in likes: st.write("• " + p.get("name",""))